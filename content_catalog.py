@@ -0,0 +1,259 @@
+"""
+Content catalog
+===============
+A lightweight index of the front matter of all Markdown content.
+
+Only the front matter of each file is parsed (reading stops at the closing
+``---``), and the result is persisted as a JSON index keyed by path and
+modification time. Refreshing the catalog only re-parses files that were
+added or changed since the last run, so queries don't need a Pelican build.
+"""
+import fnmatch
+import json
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from slugify import slugify
+
+FRONT_MATTER_DELIMITER = "---"
+INDEX_VERSION = 1
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    path: str
+    mtime: int
+    metadata: Dict[str, str]
+    default_status: str = "published"
+
+    @property
+    def folder(self) -> Optional[str]:
+        parts = Path(self.path).parts
+        return parts[0] if len(parts) > 1 else None
+
+    @property
+    def category(self) -> Optional[str]:
+        return self.metadata.get("category") or self.folder
+
+    @property
+    def title(self) -> str:
+        return self.metadata.get("title", "")
+
+    @property
+    def slug(self) -> str:
+        return self.metadata.get("slug") or slugify(self.title)
+
+    @property
+    def xref(self) -> Optional[str]:
+        return self.metadata.get("xref")
+
+    @property
+    def status(self) -> str:
+        return self.metadata.get("status", self.default_status).lower()
+
+    @property
+    def tags(self) -> List[str]:
+        tags = self.metadata.get("tags", "").split(",")
+        return [t.strip() for t in tags if t.strip()]
+
+    @property
+    def series(self) -> Optional[str]:
+        return self.metadata.get("series")
+
+    @property
+    def series_index(self) -> Optional[int]:
+        try:
+            return int(self.metadata["series_index"])
+        except (KeyError, ValueError):
+            return None
+
+
+def read_front_matter(path: Path) -> Dict[str, str]:
+    """Read the front matter of a Markdown file without reading the content.
+
+    Keys are lowercased, and indented lines are appended to the value of the
+    previous key, just like the Markdown ``meta`` extension does.
+    """
+    metadata: Dict[str, str] = {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        if f.readline().strip() != FRONT_MATTER_DELIMITER:
+            return metadata
+
+        key: Optional[str] = None
+        for line in f:
+            if line.strip() == FRONT_MATTER_DELIMITER:
+                break
+            if line[:1].isspace() and key is not None:
+                if line.strip():
+                    metadata[key] = f"{metadata[key]}\n{line.strip()}".strip()
+                continue
+            name, separator, value = line.partition(":")
+            if not separator:
+                continue
+            key = name.strip().lower()
+            metadata[key] = value.strip()
+
+    return metadata
+
+
+class ContentCatalog:
+    def __init__(
+        self,
+        content_root: Path,
+        index_path: Path,
+        default_status: str = "published",
+        page_paths: Iterable[str] = ("pages",),
+        article_excludes: Iterable[str] = (),
+        ignore_files: Iterable[str] = (".#*",),
+    ):
+        self.content_root = Path(content_root)
+        self.index_path = Path(index_path)
+        self.default_status = default_status
+        self.excludes = tuple(page_paths) + tuple(article_excludes)
+        self.ignore_files = tuple(ignore_files)
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._articles: List[CatalogEntry] = []
+
+    def refresh(self) -> "ContentCatalog":
+        """Update the index with the files that changed since the last refresh"""
+        cached = self._load_index()
+        entries: Dict[str, CatalogEntry] = {}
+        changed = False
+
+        for path, mtime in self._scan():
+            entry = cached.pop(path, None)
+            if entry is None or entry.mtime != mtime:
+                metadata = read_front_matter(self.content_root / path)
+                entry = CatalogEntry(path, mtime, metadata, self.default_status)
+                changed = True
+            entries[path] = entry
+
+        self._entries = entries
+        self._articles = [e for e in self.entries if not self._is_excluded(e)]
+
+        # Anything left in the cached index has been removed from disk
+        if changed or cached:
+            self._save_index()
+
+        return self
+
+    @property
+    def entries(self) -> List[CatalogEntry]:
+        return [self._entries[path] for path in sorted(self._entries)]
+
+    def articles(self) -> List[CatalogEntry]:
+        return list(self._articles)
+
+    def published(self) -> List[CatalogEntry]:
+        return [e for e in self.articles() if e.status == "published"]
+
+    def drafts(self) -> List[CatalogEntry]:
+        return [e for e in self.articles() if e.status == "draft"]
+
+    def categories(self) -> List[str]:
+        return sorted({e.category for e in self.articles() if e.category})
+
+    def tags(self) -> Dict[str, List[CatalogEntry]]:
+        """Articles per tag.
+
+        Tags are grouped by slug, like Pelican does. The first spelling found
+        is used as the name of the tag.
+        """
+        slugs: Dict[str, str] = {}
+        names: Dict[str, str] = {}
+        tags: Dict[str, List[CatalogEntry]] = defaultdict(list)
+        for entry in self.articles():
+            seen = set()
+            for tag in entry.tags:
+                if tag not in slugs:
+                    slugs[tag] = slugify(tag)
+                if slugs[tag] in seen:
+                    continue
+                seen.add(slugs[tag])
+                name = names.setdefault(slugs[tag], tag)
+                tags[name].append(entry)
+        return dict(sorted(tags.items(), key=lambda item: item[0].lower()))
+
+    def series(self) -> Dict[str, List[CatalogEntry]]:
+        """Articles per series, ordered by ``series_index``"""
+        series: Dict[str, List[CatalogEntry]] = defaultdict(list)
+        for entry in self.articles():
+            if entry.series:
+                series[entry.series].append(entry)
+        for entries in series.values():
+            entries.sort(key=lambda e: (e.series_index is None, e.series_index or 0))
+        return dict(sorted(series.items()))
+
+    def find_by_slug(self, slug: str) -> Optional[CatalogEntry]:
+        return next((e for e in self.articles() if e.slug == slug), None)
+
+    def duplicates(self, attribute: str) -> Dict[str, List[CatalogEntry]]:
+        """Articles that share the same value for ``attribute``, e.g. ``slug``"""
+        found: Dict[str, List[CatalogEntry]] = defaultdict(list)
+        for entry in self.articles():
+            value = getattr(entry, attribute)
+            if value:
+                found[value].append(entry)
+        return {value: entries for value, entries in found.items() if len(entries) > 1}
+
+    def _is_excluded(self, entry: CatalogEntry) -> bool:
+        """Pages and ARTICLE_EXCLUDES are not articles"""
+        return any(
+            entry.path == exclude or entry.path.startswith(f"{exclude}/")
+            for exclude in self.excludes
+        )
+
+    def _is_ignored(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore_files)
+
+    def _scan(self) -> Iterator[Tuple[str, int]]:
+        # Follow symlinks like Pelican does, but don't enter symlink loops
+        directories = [(str(self.content_root), "", ())]
+        while directories:
+            directory, prefix, ancestors = directories.pop()
+            real_path = os.path.realpath(directory)
+            if real_path in ancestors:
+                continue
+            ancestors += (real_path,)
+
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if self._is_ignored(entry.name):
+                        continue
+                    if entry.is_dir():
+                        path = f"{prefix}{entry.name}/"
+                        directories.append((entry.path, path, ancestors))
+                    elif entry.name.endswith(".md"):
+                        yield f"{prefix}{entry.name}", entry.stat().st_mtime_ns
+
+    def _load_index(self) -> Dict[str, CatalogEntry]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if index.get("version") != INDEX_VERSION:
+            return {}
+
+        return {
+            path: CatalogEntry(
+                path, item["mtime"], item["metadata"], self.default_status
+            )
+            for path, item in index["entries"].items()
+        }
+
+    def _save_index(self):
+        index = {
+            "version": INDEX_VERSION,
+            "entries": {
+                path: {"mtime": entry.mtime, "metadata": entry.metadata}
+                for path, entry in self._entries.items()
+            },
+        }
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
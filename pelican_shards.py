@@ -0,0 +1,125 @@
+"""
+Plugin for Pelican to split a build over multiple workers
+=========================================================
+Articles are partitioned into shards, either by category or by a hash of
+their source path. A sharded build runs in three modes, set with the
+SHARD_MODE setting:
+
+- ``read``: parse the Markdown of one shard into Pelican's reader cache.
+  Nothing is written.
+- ``render``: load the merged reader cache of all shards and write only
+  the article and draft pages of one shard. Static files are not copied.
+- ``merge``: load the merged reader cache of all shards and write
+  everything except the article and draft pages: index, tag, category,
+  author and archive pages, pages and feeds.
+
+Because every ``render`` and ``merge`` worker builds the full context from
+the cache, each page is rendered exactly like it is in a single build.
+"""
+import logging
+import os
+import pickle
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from pelican import signals
+from pelican.generators import StaticGenerator
+from pelican.writers import Writer
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("hash", "category")
+READER_CACHE_NAME = "ArticlesGenerator-Readers"
+
+
+def shard_of(
+    source_path: str,
+    shards: int,
+    strategy: str = "hash",
+    category: Optional[str] = None,
+) -> int:
+    """Return the shard of an article.
+
+    ``source_path`` is relative to the content root. ``category`` is the
+    category Pelican assigns to the article, from its metadata or its folder.
+    """
+    if strategy == "category":
+        key = category or ""
+    elif strategy == "hash":
+        key = source_path
+    else:
+        valid_strategies = ", ".join(STRATEGIES)
+        raise ValueError(
+            f"{strategy} is not a valid shard strategy. use one of {valid_strategies}"
+        )
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+def merge_reader_caches(cache_paths: Iterable[Path], target_path: Path) -> Dict:
+    """Combine the article reader caches of all shards into a single cache"""
+    cache = {}
+    for cache_path in cache_paths:
+        with open(Path(cache_path) / READER_CACHE_NAME, "rb") as f:
+            cache.update(pickle.load(f))
+
+    # Write to a temporary file first, so workers on the same host that merge
+    # the caches at the same time never read a partially written cache.
+    Path(target_path).mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=target_path, delete=False) as f:
+        pickle.dump(cache, f)
+    os.replace(f.name, Path(target_path) / READER_CACHE_NAME)
+
+    return cache
+
+
+class ShardWriter(Writer):
+    def write_file(self, name, template, context, *args, **kwargs):
+        if self._is_selected(kwargs.get("article")):
+            super().write_file(name, template, context, *args, **kwargs)
+
+    def write_feed(self, *args, **kwargs):
+        if self.settings["SHARD_MODE"] == "merge":
+            return super().write_feed(*args, **kwargs)
+
+    def _is_selected(self, article) -> bool:
+        mode = self.settings["SHARD_MODE"]
+
+        if mode == "merge":
+            return article is None
+        if mode == "render" and article is not None:
+            shard = shard_of(
+                article.get_relative_source_path(),
+                self.settings["SHARD_COUNT"],
+                self.settings["SHARD_STRATEGY"],
+                str(article.category),
+            )
+            return shard == self.settings["SHARD_INDEX"]
+        return False
+
+
+def get_writer(pelican_object):
+    if "SHARD_MODE" not in pelican_object.settings:
+        logger.warning("pelican_shards is enabled, but SHARD_MODE is not set")
+        return None
+    return ShardWriter
+
+
+def skip_static_files(generators):
+    """Only the merge worker copies static files to its output.
+
+    The static generator still builds its context, so links to static files
+    in articles are resolved like in a single build.
+    """
+    for generator in generators:
+        if (
+            isinstance(generator, StaticGenerator)
+            and generator.settings.get("SHARD_MODE", "merge") != "merge"
+        ):
+            generator.generate_output = lambda writer=None: None
+
+
+def register():
+    signals.get_writer.connect(get_writer)
+    signals.all_generators_finalized.connect(skip_static_files)
@@ -1,19 +1,24 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+import filecmp
 import os
 import shutil
+import subprocess
 import sys
 from datetime import date
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, List, Optional, Set
 
 from invoke import task
+from invoke.exceptions import Exit
 from pelican.server import ComplexHTTPRequestHandler, RootedHTTPServer
 from pelican.settings import DEFAULT_CONFIG, get_settings_from_file
 from slugify import slugify
 
+from content_catalog import CatalogEntry, ContentCatalog
 from netlify_client import NetlifyClient
+from pelican_shards import STRATEGIES, merge_reader_caches, shard_of
 from utils import yes_or_no
 
 PROJECT_ROOT = Path().absolute()
@@ -35,8 +40,41 @@ CONFIG = {
     "commit_message": "'Publish site on {}'".format(datetime.date.today().isoformat()),
     # Port for `serve`
     "port": 8000,
+    # Front matter index used by the content catalog tasks
+    "catalog_path": ".content-catalog.json",
+    # Working directory for sharded builds
+    "shard_path": "shards",
+    # Pelican collects source files in a set, so articles with the same date are
+    # ordered by string hash. Use a fixed seed to make every worker agree.
+    "shard_hash_seed": "0",
 }
 
+SHARD_SETTINGS = """\
+import os
+import sys
+
+sys.path.append(os.curdir)
+
+from {settings_module} import *  # noqa
+
+PATH = os.path.abspath(PATH)
+THEME = os.path.abspath(THEME)
+OUTPUT_PATH = {output_path!r}
+
+PLUGINS = PLUGINS + ["pelican_shards"]
+SHARD_MODE = {mode!r}
+SHARD_INDEX = {index!r}
+SHARD_COUNT = {shards!r}
+SHARD_STRATEGY = {strategy!r}
+
+CACHE_PATH = {cache_path!r}
+CACHE_CONTENT = {cache_content!r}
+LOAD_CONTENT_CACHE = {load_content_cache!r}
+CONTENT_CACHING_LAYER = "reader"
+CHECK_MODIFIED_METHOD = "md5"
+GZIP_CACHE = False
+"""
+
 
 @task
 def clean(c):
@@ -123,6 +161,207 @@ def livereload(c):
     server.serve(port=CONFIG["port"], root=CONFIG["deploy_path"])
 
 
+def shard_dir(name: str) -> Path:
+    return PROJECT_ROOT / CONFIG["shard_path"] / name
+
+
+def shard_env() -> dict:
+    return {"PYTHONHASHSEED": CONFIG["shard_hash_seed"]}
+
+
+def check_strategy(strategy: str):
+    if strategy not in STRATEGIES:
+        valid_strategies = ", ".join(STRATEGIES)
+        raise Exit(f"{strategy} is not a valid strategy. use one of {valid_strategies}")
+
+
+def write_shard_settings(
+    name: str, mode: str, index: Optional[int], shards: int, strategy: str, **extra
+) -> Path:
+    """Write the Pelican settings file for a single shard worker"""
+    check_strategy(strategy)
+    worker_dir = shard_dir(name)
+    if worker_dir.exists():
+        shutil.rmtree(worker_dir)
+    worker_dir.mkdir(parents=True)
+
+    settings = SHARD_SETTINGS.format(
+        settings_module=Path(CONFIG["settings_publish"]).stem,
+        output_path=str(worker_dir / "output"),
+        cache_path=str(worker_dir / "cache" if mode == "read" else shard_dir("cache")),
+        cache_content=mode == "read",
+        load_content_cache=mode != "read",
+        mode=mode,
+        index=index,
+        shards=shards,
+        strategy=strategy,
+    )
+    for setting, value in extra.items():
+        settings += f"{setting} = {value!r}\n"
+
+    settings_file = worker_dir / "shardconf.py"
+    settings_file.write_text(settings)
+    return settings_file
+
+
+def catalog_category(entry: CatalogEntry) -> str:
+    """The category Pelican gives to an article in the catalog"""
+    return entry.category or SETTINGS["DEFAULT_CATEGORY"]
+
+
+def write_read_settings(index: int, shards: int, strategy: str) -> Path:
+    check_strategy(strategy)
+    paths = [
+        entry.path
+        for entry in get_catalog().articles()
+        if shard_of(entry.path, shards, strategy, catalog_category(entry)) == index
+    ]
+    return write_shard_settings(
+        f"read-{index}",
+        "read",
+        index,
+        shards,
+        strategy,
+        ARTICLE_PATHS=paths,
+        PAGE_PATHS=[],
+        STATIC_PATHS=[],
+        THEME_STATIC_PATHS=[],
+    )
+
+
+def merge_shard_caches(shards: int):
+    """Combine the reader caches of all `shard-read` runs"""
+    try:
+        cache = merge_reader_caches(
+            [shard_dir(f"read-{index}") / "cache" for index in range(shards)],
+            shard_dir("cache"),
+        )
+    except FileNotFoundError as e:
+        raise Exit(f"Missing reader cache, did all shards run `shard-read`? {e}")
+
+    # Pelican keys the cache by absolute path, so caches made in another
+    # checkout location would never be used.
+    foreign = [path for path in cache if not path.startswith(f"{CONTENT_ROOT}{os.sep}")]
+    if foreign:
+        raise Exit(
+            f"The reader cache contains {foreign[0]}, which is not in {CONTENT_ROOT}. "
+            "All shards must be built from the same checkout path."
+        )
+
+
+def run_pelican_in_parallel(settings_files: Iterable[Path]):
+    processes = [
+        subprocess.Popen(
+            ["pelican", "-s", str(settings_file)], env={**os.environ, **shard_env()}
+        )
+        for settings_file in settings_files
+    ]
+    failed = [p.args[-1] for p in processes if p.wait() != 0]
+    if failed:
+        raise Exit(f"Pelican failed for {', '.join(failed)}")
+
+
+def assemble_shards(c, shards: int):
+    """Copy the output of the merge and all render workers to the deploy path"""
+    sources: List[Path] = [shard_dir("merge") / "output"]
+    sources += [shard_dir(f"render-{index}") / "output" for index in range(shards)]
+
+    clean(c)
+    for source in sources:
+        for root, _, files in os.walk(source):
+            target = Path(CONFIG["deploy_path"]) / os.path.relpath(root, source)
+            target.mkdir(parents=True, exist_ok=True)
+            for filename in files:
+                shutil.copy2(os.path.join(root, filename), target / filename)
+
+
+def files_in(directory: Path) -> Set[Path]:
+    return {
+        path.relative_to(directory) for path in directory.glob("**/*") if path.is_file()
+    }
+
+
+SHARD_HELP = {
+    "shards": "The total number of shards.",
+    "strategy": "Partition the articles by 'hash' of their path or by 'category'.",
+}
+SHARD_WORKER_HELP = {
+    "index": "The index of the shard handled by this worker, starting at 0.",
+    **SHARD_HELP,
+}
+
+
+@task(help=SHARD_WORKER_HELP)
+def shard_read(c, index, shards, strategy="hash"):
+    """Parse the Markdown of one shard of the articles into a reader cache"""
+    settings_file = write_read_settings(int(index), int(shards), strategy)
+    c.run(f"pelican -s '{settings_file}'", env=shard_env())
+
+
+@task(help=SHARD_WORKER_HELP)
+def shard_render(c, index, shards, strategy="hash"):
+    """Render the article pages of one shard. Needs the caches of all shards"""
+    merge_shard_caches(int(shards))
+    settings_file = write_shard_settings(
+        f"render-{index}", "render", int(index), int(shards), strategy
+    )
+    c.run(f"pelican -s '{settings_file}'", env=shard_env())
+
+
+@task(help=SHARD_HELP)
+def shard_merge(c, shards, strategy="hash"):
+    """Render all other pages and assemble the output of all shards"""
+    merge_shard_caches(int(shards))
+    settings_file = write_shard_settings("merge", "merge", None, int(shards), strategy)
+    c.run(f"pelican -s '{settings_file}'", env=shard_env())
+    assemble_shards(c, int(shards))
+
+
+@task(help=SHARD_HELP)
+def sharded_preview(c, shards=os.cpu_count(), strategy="hash"):
+    """`preview`, with the articles split over multiple worker processes"""
+    run_pelican_in_parallel(
+        write_read_settings(index, shards, strategy) for index in range(shards)
+    )
+    merge_shard_caches(shards)
+
+    settings_files = [
+        write_shard_settings(f"render-{index}", "render", index, shards, strategy)
+        for index in range(shards)
+    ]
+    settings_files.append(
+        write_shard_settings("merge", "merge", None, shards, strategy)
+    )
+    run_pelican_in_parallel(settings_files)
+    assemble_shards(c, shards)
+
+
+@task(help=SHARD_HELP)
+def verify_sharded_build(c, shards=os.cpu_count(), strategy="hash"):
+    """Check that `sharded-preview` builds exactly the same site as `preview`"""
+    reference_path = shard_dir("reference")
+    c.run(
+        f"pelican -s {CONFIG['settings_publish']} -o '{reference_path}'",
+        env=shard_env(),
+    )
+    sharded_preview(c, shards, strategy)
+
+    deploy_path = Path(CONFIG["deploy_path"]).absolute()
+    reference = files_in(reference_path)
+    sharded = files_in(deploy_path)
+
+    differences = sorted(reference ^ sharded) + [
+        path
+        for path in sorted(reference & sharded)
+        if not filecmp.cmp(reference_path / path, deploy_path / path, shallow=False)
+    ]
+    for path in differences:
+        print(f"Differs: {path}")
+    if differences:
+        raise Exit(code=1)
+    print(f"Sharded build is identical to a single build ({len(reference)} files)")
+
+
 @task(
     help={
         "site-id": "Name of your site in Netlify.",
@@ -136,30 +375,123 @@ def deploy(c, site_id, token, build_dir):
     client.deploy(build_dir)
 
 
+def get_catalog() -> ContentCatalog:
+    catalog = ContentCatalog(
+        CONTENT_ROOT,
+        PROJECT_ROOT / CONFIG["catalog_path"],
+        default_status=SETTINGS["DEFAULT_METADATA"].get("status", "published"),
+        page_paths=SETTINGS["PAGE_PATHS"],
+        article_excludes=SETTINGS["ARTICLE_EXCLUDES"],
+        ignore_files=SETTINGS["IGNORE_FILES"],
+    )
+    return catalog.refresh()
+
+
+def print_entry(entry: CatalogEntry):
+    print(f"{entry.status:<10} {entry.path:<70} {entry.title}")
+
+
+@task(
+    help={
+        "drafts": "Only list drafts.",
+        "tag": "Only list articles with this tag.",
+        "series": "Only list articles in this series.",
+    }
+)
+def list_articles(c, drafts=False, tag=None, series=None):
+    """List articles using the content catalog"""
+    catalog = get_catalog()
+    entries = catalog.drafts() if drafts else catalog.articles()
+
+    if tag is not None:
+        entries = [e for e in entries if slugify(tag) in map(slugify, e.tags)]
+    if series is not None:
+        entries = [e for e in entries if e.series == series]
+
+    for entry in entries:
+        print_entry(entry)
+
+
+@task
+def list_tags(c):
+    """List all tags and the number of articles using them"""
+    for tag, entries in get_catalog().tags().items():
+        print(f"{len(entries):>4} {tag}")
+
+
+@task
+def list_series(c):
+    """List all series and their articles"""
+    for series, entries in get_catalog().series().items():
+        print(series)
+        for entry in entries:
+            print(f"    {entry.series_index or '-':>3} {entry.path}")
+
+
+@task
+def check_content(c):
+    """Check for articles with duplicate slugs or xref ids"""
+    catalog = get_catalog()
+    found = False
+
+    for attribute in ("slug", "xref"):
+        for value, entries in catalog.duplicates(attribute).items():
+            found = True
+            print(f'Duplicate {attribute} "{value}":')
+            for entry in entries:
+                print(f"    {entry.path}")
+
+    if found:
+        raise Exit(code=1)
+
+
 @task
 def new_article(c, title, author="Johan Vergeer"):
+    catalog = get_catalog()
+    slug = slugify(title)
+
+    existing = catalog.find_by_slug(slug)
+    if existing is not None:
+        raise Exit(f'An article with slug "{slug}" already exists: {existing.path}')
+
     category: Optional[str] = None
+    folder: Optional[str] = None
     create_category: bool = False
+    known_categories = {slugify(e.category): e for e in reversed(catalog.articles())}
 
     while category is None:
         category = input("Category: ").lower()
 
-        if not (CONTENT_ROOT / category).exists():
+        if slugify(category) in known_categories:
+            # Reuse the spelling and the folder of the existing category
+            existing = known_categories[slugify(category)]
+            category = existing.category
+            folder = existing.folder or category
+        else:
             create_category = yes_or_no(
                 f'Category "{category}" does not exist yet. Do you want to create it'
             )
             if create_category is False:
                 category = None
                 continue
+            folder = category
 
-    tags = [t.strip() for t in input("Tags: ").lower().split(",")]
-    slug = slugify(title)
+    known_tags = {slugify(t): t for t in catalog.tags()}
+    tags = []
+    for tag in [t.strip() for t in input("Tags: ").split(",") if t.strip()]:
+        if slugify(tag) in known_tags:
+            tags.append(known_tags[slugify(tag)])
+        elif yes_or_no(f'Tag "{tag}" does not exist yet. Do you want to add it'):
+            tags.append(tag.lower())
+
+    # The folder only sets the category when there's no category in the header
+    category_line = f"category: {category}\n" if category != folder else ""
 
     header = f"""---
 title: {title}
 slug: {slug}
 xref: {slug}
-Tags: {",".join(tags)}
+{category_line}Tags: {",".join(tags)}
 author: {author}
 description: TODO
 status: draft
@@ -169,7 +501,7 @@ status: draft
     filename = f"{date.today().strftime('%Y-%m-%d')}_{slug}.md"
 
     if create_category:
-        (CONTENT_ROOT / category).mkdir()
+        (CONTENT_ROOT / folder).mkdir(exist_ok=True)
 
-    with open(CONTENT_ROOT / category / filename, "w") as article:
+    with open(CONTENT_ROOT / folder / filename, "w") as article:
         article.write(header)
@@ -0,0 +1,16 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).absolute().parent.parent
+
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@pytest.fixture(scope="session")
+def tasks():
+    """The invoke tasks module. It reads pelicanconf.py from the working directory"""
+    os.chdir(PROJECT_ROOT)
+    return pytest.importorskip("tasks")
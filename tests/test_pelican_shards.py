@@ -0,0 +1,127 @@
+import os
+import pickle
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pelican")
+
+from pelican_shards import (  # noqa: E402
+    READER_CACHE_NAME,
+    ShardWriter,
+    merge_reader_caches,
+    shard_of,
+)
+
+PATHS = [f"category-{i % 3}/article-{i}.md" for i in range(50)]
+
+
+def test_shard_of_does_not_depend_on_the_hash_seed():
+    code = (
+        "from pelican_shards import shard_of;"
+        f"print([shard_of(p, 4) for p in {PATHS!r}])"
+    )
+    for seed in ("1", "2"):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+            cwd=os.path.dirname(os.path.dirname(__file__)),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        assert output.stdout.decode().strip() == str([shard_of(p, 4) for p in PATHS])
+
+
+@pytest.mark.parametrize("strategy", ["hash", "category"])
+@pytest.mark.parametrize("shards", [1, 2, 5])
+def test_shard_of_is_in_range(strategy, shards):
+    for path in PATHS:
+        category = path.split("/")[0]
+        assert 0 <= shard_of(path, shards, strategy, category) < shards
+
+
+def test_shard_of_category_uses_the_category_not_the_folder():
+    first = shard_of("python/a.md", 7, "category", "Design")
+    second = shard_of("dotnet/b.md", 7, "category", "Design")
+    assert first == second
+
+
+def test_shard_of_rejects_an_invalid_strategy():
+    with pytest.raises(ValueError):
+        shard_of("python/a.md", 2, "folder")
+
+
+def create_writer(tmp_path, mode, index=None, shards=2):
+    settings = {
+        "RELATIVE_URLS": False,
+        "SHARD_MODE": mode,
+        "SHARD_INDEX": index,
+        "SHARD_COUNT": shards,
+        "SHARD_STRATEGY": "hash",
+    }
+    return ShardWriter(str(tmp_path), settings=settings)
+
+
+def create_article(path):
+    return SimpleNamespace(
+        get_relative_source_path=lambda: path, category=path.split("/")[0]
+    )
+
+
+def test_read_writes_nothing(tmp_path):
+    writer = create_writer(tmp_path, "read", index=0)
+    assert not writer._is_selected(None)
+    assert not writer._is_selected(create_article("python/a.md"))
+
+
+def test_render_writes_only_articles_of_its_shard(tmp_path):
+    article = create_article("python/a.md")
+    shard = shard_of("python/a.md", 2)
+
+    assert create_writer(tmp_path, "render", index=shard)._is_selected(article)
+    assert not create_writer(tmp_path, "render", index=1 - shard)._is_selected(article)
+    assert not create_writer(tmp_path, "render", index=shard)._is_selected(None)
+
+
+def test_merge_writes_everything_but_articles(tmp_path):
+    writer = create_writer(tmp_path, "merge")
+    assert writer._is_selected(None)
+    assert not writer._is_selected(create_article("python/a.md"))
+
+
+def write_cache(path, cache):
+    path.mkdir(parents=True)
+    with open(path / READER_CACHE_NAME, "wb") as f:
+        pickle.dump(cache, f)
+
+
+def test_merge_reader_caches(tmp_path):
+    write_cache(tmp_path / "read-0", {"/content/a.md": ("stamp-a", "a")})
+    write_cache(tmp_path / "read-1", {"/content/b.md": ("stamp-b", "b")})
+
+    cache = merge_reader_caches(
+        [tmp_path / "read-0", tmp_path / "read-1"], tmp_path / "cache"
+    )
+
+    expected = {"/content/a.md": ("stamp-a", "a"), "/content/b.md": ("stamp-b", "b")}
+    assert cache == expected
+    with open(tmp_path / "cache" / READER_CACHE_NAME, "rb") as f:
+        assert pickle.load(f) == expected
+    assert os.listdir(tmp_path / "cache") == [READER_CACHE_NAME]
+
+
+def test_merge_shard_caches_rejects_caches_from_another_checkout(
+    tasks, tmp_path, monkeypatch
+):
+    from invoke.exceptions import Exit
+
+    monkeypatch.setattr(tasks, "shard_dir", lambda name: tmp_path / name)
+    content_path = str(tasks.CONTENT_ROOT / "a.md")
+    write_cache(tmp_path / "read-0" / "cache", {content_path: ("s", "a")})
+    write_cache(tmp_path / "read-1" / "cache", {"/elsewhere/content/b.md": ("s", "b")})
+
+    tasks.merge_shard_caches(1)
+    with pytest.raises(Exit):
+        tasks.merge_shard_caches(2)
@@ -0,0 +1,67 @@
+import filecmp
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("pelican")
+
+from invoke import Config, Context  # noqa: E402
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("pelican") is None, reason="pelican is not on the PATH"
+)
+
+
+@pytest.fixture
+def shard_config(tasks, tmp_path, monkeypatch):
+    monkeypatch.setitem(tasks.CONFIG, "shard_path", str(tmp_path / "shards"))
+    monkeypatch.setitem(tasks.CONFIG, "deploy_path", str(tmp_path / "output"))
+    monkeypatch.setitem(tasks.CONFIG, "catalog_path", str(tmp_path / "catalog.json"))
+    return tasks.CONFIG
+
+
+def build_single(tasks, output_path):
+    subprocess.run(
+        ["pelican", "-s", tasks.CONFIG["settings_publish"], "-o", str(output_path)],
+        env={**os.environ, **tasks.shard_env()},
+        check=True,
+    )
+
+
+def assert_identical(tasks, reference_path, output_path):
+    reference = tasks.files_in(reference_path)
+    assert reference
+    assert tasks.files_in(output_path) == reference
+    for path in reference:
+        assert filecmp.cmp(
+            reference_path / path, output_path / path, shallow=False
+        ), f"{path} differs"
+
+
+@pytest.mark.parametrize("strategy", ["hash", "category"])
+def test_sharded_preview_is_identical_to_single_build(
+    tasks, shard_config, tmp_path, strategy
+):
+    build_single(tasks, tmp_path / "reference")
+
+    tasks.sharded_preview(Context(), shards=3, strategy=strategy)
+
+    assert_identical(tasks, tmp_path / "reference", tmp_path / "output")
+
+
+def test_separate_stages_are_identical_to_single_build(tasks, shard_config, tmp_path):
+    build_single(tasks, tmp_path / "reference")
+
+    c = Context(Config(overrides={"run": {"in_stream": False}}))
+    for index in range(2):
+        tasks.shard_read(c, index, 2)
+    for index in range(2):
+        tasks.shard_render(c, index, 2)
+    tasks.shard_merge(c, 2)
+
+    assert_identical(tasks, tmp_path / "reference", tmp_path / "output")
+    for index in range(2):
+        render_output = tmp_path / "shards" / f"render-{index}" / "output"
+        assert all(p.suffix == ".html" for p in tasks.files_in(render_output))